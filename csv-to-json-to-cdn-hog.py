@@ -10,14 +10,49 @@ import argparse
 import csv
 import json
 import os
+import queue
+import random
+import socket
 import sys
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
 from urllib.parse import quote
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import requests  # type: ignore
 from requests.adapters import HTTPAdapter, Retry  # type: ignore
+from urllib3.connection import HTTPConnection  # type: ignore
 from tqdm import tqdm  # type: ignore
 
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+try:
+    import httpx  # type: ignore
+except ImportError:
+    httpx = None
+
+try:
+    import polars as pl  # type: ignore
+except ImportError:
+    pl = None
+
+try:
+    import pyarrow as pa  # type: ignore
+    from pyarrow import csv as pacsv  # type: ignore
+except ImportError:
+    pa = None
+    pacsv = None
+
+if httpx is not None:
+    TRANSPORT_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+else:
+    TRANSPORT_ERRORS = (requests.exceptions.RequestException,)
+
 # -------------------- Defaults (override via CLI) --------------------
 DEFAULT_CSV_FILE = "Hogs.csv"
 DEFAULT_DEST_PATH = "hog_jsons/"
@@ -30,140 +65,416 @@ DEFAULT_ACCESS_KEY = os.getenv("BUNNY_ACCESS_KEY", "")
 DEFAULT_REGION_HOST = os.getenv("BUNNY_REGION_HOST", None)
 
 
-def make_session():
-    """Create a requests session with retry logic."""
+class JitteredRetry(Retry):
+    """Retry with full-jitter exponential backoff so concurrent workers
+    don't all retry at the same deterministic offsets when Bunny
+    transiently 5xx's."""
+
+    BACKOFF_CAP = 30.0
+
+    def get_backoff_time(self):
+        base = super().get_backoff_time()
+        if base <= 0:
+            return base
+        return random.uniform(0, min(self.BACKOFF_CAP, base))
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when the circuit breaker is open and uploads fail fast."""
+
+
+class CircuitBreaker:
+    """Fail fast when the CDN is consistently erroring instead of letting
+    every worker keep hammering it through its retries."""
+
+    def __init__(self, threshold=10, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            if time.monotonic() < self._open_until:
+                raise CircuitOpenError(
+                    f"circuit open for {self._open_until - time.monotonic():.0f}s "
+                    "after repeated CDN failures"
+                )
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._open_until = time.monotonic() + self.cooldown
+                self._failures = 0
+
+
+class AdaptiveSemaphore:
+    """Gate on in-flight uploads, halving permits when Bunny throttles
+    (429) and restoring them one at a time on success streaks (AIMD)."""
+
+    SUCCESS_STREAK = 50
+
+    def __init__(self, max_permits):
+        self.max_permits = max_permits
+        self._permits = max_permits
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self._in_flight >= self._permits:
+                self._cond.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def decrease(self):
+        """Halve permits after a throttle response (min 1)."""
+        with self._cond:
+            self._permits = max(1, self._permits // 2)
+            self._successes = 0
+
+    def increase(self):
+        """Count a success; restore one permit after a long streak."""
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.SUCCESS_STREAK and self._permits < self.max_permits:
+                self._permits += 1
+                self._successes = 0
+                self._cond.notify()
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keepalive on pooled connections so
+    Bunny connections survive across many PUTs."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+def make_session(concurrency=DEFAULT_CONCURRENCY):
+    """Create a requests session with retry logic, sized to the worker
+    count so the pool never churns connections."""
     s = requests.Session()
-    retries = Retry(
+    # 429 is deliberately not force-listed: throttling is handled by the
+    # AdaptiveSemaphore so concurrency shrinks instead of blind retries
+    retries = JitteredRetry(
         total=5,
         backoff_factor=0.6,
-        status_forcelist=[429, 500, 502, 503, 504],
+        status_forcelist=[500, 502, 503, 504],
         allowed_methods=["GET", "PUT"]
     )
-    adapter = HTTPAdapter(
-        max_retries=retries, pool_connections=50, pool_maxsize=50
+    adapter = KeepAliveAdapter(
+        max_retries=retries,
+        pool_connections=concurrency,
+        pool_maxsize=concurrency * 2,
+        pool_block=True
     )
     s.mount("http://", adapter)
     s.mount("https://", adapter)
     return s
 
 
-def extract_attributes_from_row(row):
-    """Extract attributes from CSV row data for HOGs."""
-    attributes = []
+def make_client(concurrency=DEFAULT_CONCURRENCY):
+    """Prefer an HTTP/2 httpx client so the thousands of small PUTs
+    multiplex over a single TLS connection; fall back to the pooled
+    requests session when httpx (or its http2 extra) is missing."""
+    if httpx is not None:
+        try:
+            return httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=concurrency,
+                    max_keepalive_connections=concurrency
+                ),
+                timeout=180
+            )
+        except ImportError:
+            # http2 extra (h2) not installed
+            pass
+    return make_session(concurrency)
+
+
+# 5xx retry budget for the httpx path, matching the JitteredRetry the
+# requests fallback gets from urllib3
+RETRY_STATUSES = (500, 502, 503, 504)
+RETRY_TOTAL = 5
+RETRY_BACKOFF_FACTOR = 0.6
+
+
+def client_put(client, url, headers, body):
+    """PUT with either client type (httpx uses content=, requests data=)."""
+    if httpx is not None and isinstance(client, httpx.Client):
+        # httpx has no transport-level status retries, so transient 5xx
+        # responses are retried here with the same jittered backoff the
+        # requests session gets for free
+        for attempt in range(RETRY_TOTAL):
+            resp = client.put(url, headers=headers, content=body)
+            if resp.status_code not in RETRY_STATUSES:
+                break
+            if attempt + 1 < RETRY_TOTAL:
+                backoff = RETRY_BACKOFF_FACTOR * (2 ** attempt)
+                time.sleep(random.uniform(
+                    0, min(JitteredRetry.BACKOFF_CAP, backoff)))
+        return resp
+    return client.put(url, headers=headers, data=body, timeout=180)
+
+
+# Map CSV columns to trait types for HOGs
+ATTRIBUTE_MAPPING = [
+    ("Attribute Background", "Background"),
+    ("Attribute Body", "Body"),
+    ("Attribute Headwear", "Headwear"),
+    ("Attribute Eyes", "Eyes"),
+    ("Attribute Clothing", "Clothing"),
+    ("Attribute Mouth", "Mouth"),
+    ("Attribute Tusks", "Tusks")
+]
+
+# Metadata keys overridable from CSV columns
+OPTIONAL_FIELDS = [
+    ("description", "Description"),
+    ("image", "Image"),
+    ("dna", "Dna"),
+    ("creator", "Creator"),
+    ("artist", "Artist")
+]
+
+# Constant parts of every metadata dict, built once; per-row code copies
+# this and overlays only the varying fields
+METADATA_TEMPLATE = {
+    "name": "",
+    "description": "The HOGs are a collection of 8888 unique HOG NFTs "
+                   "living on the XRP ledger.",
+    "image": "",
+    "dna": "",
+    "edition": "unknown",
+    "date": 1674756786096,  # Default date for HOGs
+    "creator": "Bored Apes XRP Club",
+    "artist": "Bored Apes XRP Club",
+    "attributes": []
+}
+
+
+@contextmanager
+def csv_rows(path, start_idx, end_idx):
+    """Yield (header, row iterator) for the CSV.
+
+    Prefers pyarrow's multithreaded SIMD parser, then polars' Rust
+    parser, and falls back to streaming the file through stdlib csv.
+    Rows are plain sequences of strings either way.
+    """
+    if pacsv is not None:
+        # Read the header first so every column can be pinned to string,
+        # matching what csv.reader would produce
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f), [])
+        table = pacsv.read_csv(
+            path,
+            read_options=pacsv.ReadOptions(block_size=1 << 20),
+            # No embedded newlines in this data; lets the parser split
+            # blocks without scanning for quoted line breaks
+            parse_options=pacsv.ParseOptions(newlines_in_values=False),
+            convert_options=pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in header})
+        )
+        rows = (tuple("" if v is None else v for v in vals)
+                for batch in table.to_batches()
+                for vals in zip(*(col.to_pylist()
+                                  for col in batch.columns)))
+        yield header, islice(rows, start_idx, end_idx)
+        return
 
-    # Map CSV columns to trait types for HOGs
-    attribute_mapping = {
-        "Attribute Background": "Background",
-        "Attribute Body": "Body",
-        "Attribute Headwear": "Headwear",
-        "Attribute Eyes": "Eyes",
-        "Attribute Clothing": "Clothing",
-        "Attribute Mouth": "Mouth",
-        "Attribute Tusks": "Tusks"
-    }
+    if pl is not None:
+        # infer_schema_length=0 keeps every column as a string, matching
+        # what csv.reader would produce
+        df = pl.read_csv(path, infer_schema_length=0)
+        rows = (tuple("" if v is None else v for v in row)
+                for row in df.iter_rows())
+        yield df.columns, islice(rows, start_idx, end_idx)
+        return
+
+    with open(path, 'r', encoding='utf-8', buffering=1 << 20,
+              newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        yield header, islice(reader, start_idx, end_idx)
+
+
+def resolve_columns(header):
+    """Resolve column positions once from the CSV header so per-row access
+    is plain list indexing instead of repeated dict lookups.
+
+    Returns a (name_idx, attr_idx, overlay_idx) schema tuple: the Name
+    column index (-1 when absent), (index, trait_type) pairs for
+    attributes, and (metadata_key, index) pairs for the optional fields
+    that actually exist in this CSV.
+    """
+    idx = {name: i for i, name in enumerate(header)}
+    name_idx = idx.get("Name", -1)
+    attr_idx = [(idx[col], trait) for col, trait in ATTRIBUTE_MAPPING
+                if col in idx]
+    overlay_idx = [(key, idx[col]) for key, col in OPTIONAL_FIELDS
+                   if col in idx]
+    return name_idx, attr_idx, overlay_idx
+
+
+def row_field(row, i, default=""):
+    """Fetch a column value from a row list, like dict.get on a DictReader
+    row (default only when the column is absent)."""
+    if i < 0 or i >= len(row):
+        return default
+    return row[i]
+
+
+def extract_attributes_from_row(row, attr_idx):
+    """Extract attributes from a CSV row list for HOGs."""
+    attributes = []
 
-    for csv_col, trait_type in attribute_mapping.items():
-        if csv_col in row and row[csv_col] and row[csv_col].strip():
+    for i, trait_type in attr_idx:
+        value = row[i].strip() if i < len(row) else ""
+        if value:
+            # Trait values have tiny cardinality across thousands of
+            # rows; intern collapses them to one str object each
             attributes.append({
                 "trait_type": trait_type,
-                "value": row[csv_col].strip()
+                "value": sys.intern(value)
             })
 
     return attributes
 
 
-def create_metadata_json(row):
-    """Create JSON metadata from CSV row data for HOGs."""
+def create_metadata_json(row, schema):
+    """Create JSON metadata from a CSV row list for HOGs."""
+    name_idx, attr_idx, overlay_idx = schema
+
     # Extract edition number from Name field
-    # (e.g., "HOG #3642" -> 3642)
-    name = row.get("Name", "")
-    edition = ""
-    if "#" in name:
-        edition_str = name.split("#")[-1].strip()
-        try:
-            edition = int(edition_str)
-        except ValueError:
-            edition = edition_str
+    # (e.g., "HOG #3642" -> 3642); rpartition avoids the list split
+    # allocates, and isdigit skips exception machinery on odd names
+    name = row_field(row, name_idx)
+    _, sep, tail = name.rpartition("#")
+    tail = tail.strip()
+    if sep:
+        edition = int(tail) if tail.isdigit() else tail
     else:
         edition = "unknown"
 
-    # Create the metadata JSON structure for HOGs
-    metadata = {
-        "name": name,
-        "description": row.get(
-            "Description",
-            "The HOGs are a collection of 8888 unique HOG NFTs living on "
-            "the XRP ledger."
-        ),
-        "image": row.get("Image", ""),
-        "dna": row.get("Dna", ""),
-        "edition": edition,
-        "date": 1674756786096,  # Default date for HOGs
-        "creator": row.get("Creator", "Bored Apes XRP Club"),
-        "artist": row.get("Artist", "Bored Apes XRP Club"),
-        "attributes": extract_attributes_from_row(row)
-    }
+    # Copy the constant template and overlay only the varying fields;
+    # absent columns keep their template defaults with no per-row lookups
+    metadata = METADATA_TEMPLATE.copy()
+    metadata["name"] = name
+    metadata["edition"] = edition
+    metadata["attributes"] = extract_attributes_from_row(row, attr_idx)
+    for key, i in overlay_idx:
+        metadata[key] = row[i] if i < len(row) else ""
 
     return metadata
 
 
-def bunny_put_json(session, storage_zone, access_key, region_host,
-                   dest_key, json_data):
-    """Upload JSON data directly to Bunny CDN without local file storage."""
+# Reused across all uploads; compact output since the CDN copies are
+# machine-read only
+_JSON_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+
+def serialize_metadata(json_data):
+    """Encode metadata to compact UTF-8 bytes (orjson when available).
+
+    Bytes rather than a streaming iterable: the body crosses the
+    serializer/uploader queue and must be replayable across 429 retries.
+    """
+    if orjson is not None:
+        # orjson serializes to compact bytes in a single C-level pass
+        return orjson.dumps(json_data)
+    return _JSON_ENCODER.encode(json_data).encode('utf-8')
+
+
+def bunny_base_url(storage_zone, region_host):
+    """Build the storage-zone URL prefix once per run; quote() and strip()
+    never run in the per-upload hot path."""
     base = region_host.strip() if region_host else "storage.bunnycdn.com"
-    url = f"https://{base}/{quote(storage_zone.strip())}/{dest_key}"
+    return f"https://{base}/{quote(storage_zone.strip())}/"
 
-    headers = {
-        "AccessKey": access_key.strip(),
-        "Content-Type": "application/json"
-    }
 
-    # Convert JSON to bytes
-    json_bytes = json.dumps(json_data, indent=2).encode('utf-8')
+def bunny_put_json(session, base_url, headers, dest_key, body,
+                   breaker=None, throttle=None):
+    """Upload pre-serialized JSON bytes directly to Bunny CDN."""
+    if breaker is not None:
+        breaker.check()
 
-    # Upload directly from memory
-    resp = session.put(url, headers=headers, data=json_bytes, timeout=180)
+    url = base_url + dest_key
+
+    throttle_attempts = 0
+    while True:
+        try:
+            if throttle is not None:
+                with throttle:
+                    resp = client_put(session, url, headers, body)
+            else:
+                resp = client_put(session, url, headers, body)
+        except TRANSPORT_ERRORS:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+
+        # On throttle, honor Retry-After, shrink concurrency, and retry
+        if resp.status_code == 429 and throttle is not None and throttle_attempts < 5:
+            throttle_attempts += 1
+            throttle.decrease()
+            try:
+                delay = int(resp.headers.get("Retry-After", "1"))
+            except ValueError:
+                delay = 1
+            time.sleep(max(delay, 1))
+            continue
+        break
 
     if resp.status_code not in (200, 201):
+        if breaker is not None and resp.status_code >= 500:
+            breaker.record_failure()
+        # content[:200] slices raw bytes; .text would decode the whole body
         raise RuntimeError(
-            f"Bunny upload failed ({resp.status_code}): {resp.text[:200]}"
+            f"Bunny upload failed ({resp.status_code}): {resp.content[:200]}"
         )
 
+    if breaker is not None:
+        breaker.record_success()
+    if throttle is not None:
+        throttle.increase()
     return True
 
 
-def process_nft_row(session, row, storage_zone, access_key, region_host,
-                    dest_prefix):
-    """Process a single NFT row: create JSON and upload to CDN."""
-    try:
-        # Create metadata JSON
-        metadata = create_metadata_json(row)
-
-        # Extract edition number for filename
-        edition = metadata.get("edition", "unknown")
-        if isinstance(edition, int):
-            edition_str = str(edition)
-        else:
-            edition_str = str(edition)
-            if not edition_str or edition_str == "unknown":
-                # Fallback: try to extract from Name field
-                name = row.get("Name", "")
-                if "#" in name:
-                    edition_str = name.split("#")[-1].strip()
-                else:
-                    edition_str = "unknown"
-
-        # Create destination path
-        dest_key = f"{dest_prefix}{edition_str}.json"
+def serialize_nft_row(row, dest_prefix, schema):
+    """CPU half of the pipeline: build metadata for one row and serialize
+    it. Returns (dest_key, body, identifier)."""
+    metadata = create_metadata_json(row, schema)
 
-        # Upload to CDN
-        bunny_put_json(session, storage_zone, access_key, region_host,
-                       dest_key, metadata)
-
-        return True, edition_str, None
+    # Extract edition number for filename
+    edition = metadata.get("edition", "unknown")
+    if isinstance(edition, int):
+        edition_str = str(edition)
+    else:
+        edition_str = str(edition)
+        if not edition_str or edition_str == "unknown":
+            # Fallback: try to extract from Name field
+            _, sep, tail = row_field(row, schema[0]).rpartition("#")
+            edition_str = tail.strip() if sep else "unknown"
 
-    except Exception as e:
-        return False, row.get("Name", "unknown"), str(e)
+    dest_key = f"{dest_prefix}{edition_str}.json"
+    return dest_key, serialize_metadata(metadata), edition_str
 
 
 def main():
@@ -221,81 +532,113 @@ def main():
     if args.dry_run:
         print("DRY RUN MODE - No files will be uploaded")
 
-    # Read CSV file
-    try:
-        with open(args.csv_file, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            rows = list(reader)
-    except Exception as e:
-        print(f"ERROR: Failed to read CSV file: {e}", file=sys.stderr)
-        sys.exit(1)
-
-    print(f"Found {len(rows)} rows in CSV file")
-
-    # Apply row filtering
+    # Row filtering bounds (rows are streamed, never materialized)
     start_idx = args.start_row
-    end_idx = len(rows)
-    if args.max_rows:
-        end_idx = min(start_idx + args.max_rows, len(rows))
-
-    rows_to_process = rows[start_idx:end_idx]
-    print(f"Processing rows {start_idx} to {end_idx-1} "
-          f"({len(rows_to_process)} rows)")
-
-    if not rows_to_process:
-        print("No rows to process.")
-        return
+    end_idx = start_idx + args.max_rows if args.max_rows else None
 
     if args.dry_run:
         # Show sample of what would be processed
         print("\nSample of first 3 rows that would be processed:")
-        for i, row in enumerate(rows_to_process[:3]):
-            metadata = create_metadata_json(row)
-            edition = metadata.get("edition", "unknown")
-            print(f"Row {start_idx + i}: {row.get('Name', 'Unknown')} "
-                  f"-> {edition}.json")
+        with csv_rows(args.csv_file, start_idx, start_idx + 3) as (header, rows):
+            schema = resolve_columns(header)
+            for i, row in enumerate(rows):
+                metadata = create_metadata_json(row, schema)
+                edition = metadata.get("edition", "unknown")
+                name = row_field(row, schema[0], "Unknown")
+                print(f"Row {start_idx + i}: {name} -> {edition}.json")
         return
 
-    # Create session and process rows
-    session = make_session()
+    # Create client and process rows
+    session = make_client(args.concurrency)
+    breaker = CircuitBreaker()
+    throttle = AdaptiveSemaphore(args.concurrency)
+
+    # Constant for the whole run; built once instead of per request
+    base_url = bunny_base_url(args.storage_zone, args.region_host)
+    headers = {
+        "AccessKey": args.access_key.strip(),
+        "Content-Type": "application/json"
+    }
 
     success_count = 0
     error_count = 0
     errors = []
+    counter_lock = threading.Lock()
 
-    print(f"\nStarting upload of {len(rows_to_process)} JSON files...")
-
-    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
-        pbar = tqdm(total=len(rows_to_process), desc="Uploading", unit="file")
-        futures = []
-
-        for row in rows_to_process:
-            future = pool.submit(
-                process_nft_row,
-                session,
-                row,
-                args.storage_zone,
-                args.access_key,
-                args.region_host,
-                dest_prefix
-            )
-            futures.append(future)
+    print(f"\nStreaming rows {start_idx}+ and uploading as they are read...")
 
-        for future in as_completed(futures):
+    # Serialization (CPU) and uploads (network) run in separate pools
+    # joined by a bounded queue, so CPU-heavy rows never stall PUTs and
+    # a slow CDN never stalls parsing beyond the queue depth
+    upload_queue = queue.Queue(maxsize=args.concurrency * 2)
+
+    def record_result(identifier, error):
+        nonlocal success_count, error_count
+        with counter_lock:
+            if error is None:
+                success_count += 1
+            else:
+                error_count += 1
+                errors.append(f"{identifier}: {error}")
+        pbar.update(1)
+
+    def prepare_nft_row(row):
+        """CPU worker: serialize one row and hand it to the uploaders."""
+        try:
+            item = serialize_nft_row(row, dest_prefix, schema)
+        except Exception as e:
+            record_result(row_field(row, schema[0], "unknown"), str(e))
+            return
+        upload_queue.put(item)
+
+    def upload_worker():
+        """Network worker: drain the queue and PUT until the sentinel."""
+        while True:
+            item = upload_queue.get()
+            if item is None:
+                break
+            dest_key, body, identifier = item
             try:
-                success, identifier, error = future.result()
-                if success:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    errors.append(f"{identifier}: {error}")
+                bunny_put_json(session, base_url, headers, dest_key, body,
+                               breaker, throttle)
+                record_result(identifier, None)
             except Exception as e:
-                error_count += 1
-                errors.append(f"Unknown: {str(e)}")
+                record_result(identifier, str(e))
 
-            pbar.update(1)
+    cpu_workers = os.cpu_count() or 4
 
-        pbar.close()
+    # Submit on a sliding window so memory stays bounded and uploads start
+    # while the CSV is still being read
+    window = cpu_workers * 4
+    pending = set()
+
+    try:
+        with csv_rows(args.csv_file, start_idx, end_idx) as (header, rows), \
+                ThreadPoolExecutor(max_workers=cpu_workers) as cpu_pool, \
+                ThreadPoolExecutor(max_workers=args.concurrency) as net_pool:
+            schema = resolve_columns(header)
+            pbar = tqdm(desc="Uploading", unit="file")
+            uploaders = [net_pool.submit(upload_worker)
+                         for _ in range(args.concurrency)]
+
+            try:
+                for row in rows:
+                    if len(pending) >= window:
+                        _, pending = wait(pending,
+                                          return_when=FIRST_COMPLETED)
+
+                    pending.add(cpu_pool.submit(prepare_nft_row, row))
+
+                wait(pending)
+            finally:
+                # One sentinel per uploader; each worker exits on its own
+                for _ in uploaders:
+                    upload_queue.put(None)
+                wait(uploaders)
+                pbar.close()
+    except OSError as e:
+        print(f"ERROR: Failed to read CSV file: {e}", file=sys.stderr)
+        sys.exit(1)
 
     # Print results
     print("\nProcessing complete!")
@@ -64,9 +64,11 @@ def extract_attributes_from_row(row):
 
     for csv_col, trait_type in attribute_mapping.items():
         if csv_col in row and row[csv_col] and row[csv_col].strip():
+            # Trait values have tiny cardinality across thousands of
+            # rows; intern collapses them to one str object each
             attributes.append({
                 "trait_type": trait_type,
-                "value": row[csv_col].strip()
+                "value": sys.intern(row[csv_col].strip())
             })
 
     return attributes
@@ -117,15 +119,17 @@ def bunny_put_json(session, storage_zone, access_key, region_host,
         "Content-Type": "application/json"
     }
 
-    # Convert JSON to bytes
-    json_bytes = json.dumps(json_data, indent=2).encode('utf-8')
+    # Convert JSON to bytes; no indentation, the CDN copies are
+    # machine-read only
+    json_bytes = json.dumps(json_data).encode('utf-8')
 
     # Upload directly from memory
     resp = session.put(url, headers=headers, data=json_bytes, timeout=180)
 
     if resp.status_code not in (200, 201):
+        # content[:200] slices raw bytes; .text would decode the whole body
         raise RuntimeError(
-            f"Bunny upload failed ({resp.status_code}): {resp.text[:200]}"
+            f"Bunny upload failed ({resp.status_code}): {resp.content[:200]}"
         )
 
     return True
@@ -3,21 +3,19 @@
 Single-pass IPFS -> Bunny pipeline for files named N.json (no padding).
 For each n in [start, end]:
   - GET n.json from the gateway
-  - If 200, save to temp, immediately PUT to Bunny, then delete local (optional)
+  - If 200, PUT the body straight to Bunny from memory (no temp file)
   - If 404/timeout, count as "missing"
 Stop after --max-missing consecutive misses.
 """
 
 import argparse
+import asyncio
 import os
 import sys
-import tempfile
-import shutil
 from pathlib import Path
 from urllib.parse import quote
 
-import requests
-from requests.adapters import HTTPAdapter, Retry
+import httpx
 
 # -------------------- Defaults --------------------
 DEFAULT_CID = "bafybeifi6awhcvqrzgsh37ribjk62ozzsrekql7p7rqnobuggu5jjl2d2i"
@@ -27,48 +25,160 @@ DEFAULT_END_NUMBER   = 10000
 DEFAULT_MAX_MISSING  = 75
 DEFAULT_DOWNLOAD_TIMEOUT = 180
 DEFAULT_DEST_PATH    = "ape_jsons/"
-DEFAULT_DELETE_LOCAL = True
+DEFAULT_CONCURRENCY  = 32
+DEFAULT_SAVE_DIR     = "failed_uploads"
+
+# Statuses worth retrying, mirroring the old urllib3 Retry config
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_TOTAL = 5
+RETRY_BACKOFF = 0.6
 
 # Bunny via env by default
 DEFAULT_STORAGE_ZONE = os.getenv("BUNNY_STORAGE_ZONE", "")
 DEFAULT_ACCESS_KEY   = os.getenv("BUNNY_ACCESS_KEY", "")
 DEFAULT_REGION_HOST  = os.getenv("BUNNY_REGION_HOST", None)  # e.g. "la.storage.bunnycdn.com"
 
-def make_session():
-    s = requests.Session()
-    retries = Retry(
-        total=5,
-        backoff_factor=0.6,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "PUT"]
+def make_client(concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_DOWNLOAD_TIMEOUT):
+    """Async client with a connection pool sized to the worker count."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(timeout),
+        transport=httpx.AsyncHTTPTransport(retries=2),
+        follow_redirects=True,
     )
-    adapter = HTTPAdapter(max_retries=retries, pool_connections=20, pool_maxsize=20)
-    s.mount("http://", adapter)
-    s.mount("https://", adapter)
-    return s
 
-def download_json(session: requests.Session, gateway: str, cid: str, n: int, out_file: Path, timeout: int):
+async def request_with_retries(client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    """Issue a request, retrying transient errors with exponential backoff."""
+    for attempt in range(RETRY_TOTAL):
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt == RETRY_TOTAL - 1:
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt == RETRY_TOTAL - 1:
+                return resp
+        await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+
+async def fetch_and_upload(client: httpx.AsyncClient, gateway: str, cid: str, n: int, storage_zone, access_key, region_host, dest_key, save_dir: Path = None):
+    """Fetch N.json from the gateway and PUT it to Bunny straight from memory.
+
+    Returns (status, http_code, detail) where status is one of
+    "missing", "uploaded", "upload_error".
+    """
     url = f"{gateway.rstrip('/')}/ipfs/{cid}/{n}.json"
-    with session.get(url, stream=True, timeout=timeout) as r:
-        if r.status_code != 200:
-            return False, r.status_code
-        out_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(out_file, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024*256):
-                if chunk:
-                    f.write(chunk)
-    return True, 200
-
-def bunny_put(session, storage_zone, access_key, region_host, dest_key, file_path: Path):
+
+    # Cheap existence probe first: a miss costs only headers, not a body
+    try:
+        peek = await client.head(url, timeout=30)
+    except httpx.TransportError:
+        peek = None
+    if peek is not None and peek.status_code == 404:
+        return "missing", 404, ""
+
+    # Anything else (200, 405, HEAD-hostile gateways) falls through to GET
+    r = await request_with_retries(client, "GET", url)
+    if r.status_code != 200:
+        return "missing", r.status_code, ""
+    body = r.content  # metadata JSONs are tiny; no need for a temp file
+
     base = region_host.strip() if region_host else "storage.bunnycdn.com"
-    url = f"https://{base}/{quote(storage_zone.strip())}/{dest_key}"
+    put_url = f"https://{base}/{quote(storage_zone.strip())}/{dest_key}"
     headers = {
         "AccessKey": access_key.strip(),
         "Content-Type": "application/octet-stream"
     }
-    with open(file_path, "rb") as f:
-        resp = session.put(url, headers=headers, data=f, timeout=180)
-    return resp.status_code in (200, 201), resp.status_code, resp.text[:200]
+    resp = await request_with_retries(client, "PUT", put_url, headers=headers, content=body)
+    if resp.status_code in (200, 201):
+        return "uploaded", resp.status_code, ""
+
+    if save_dir is not None:
+        # keep a local copy for inspection
+        try:
+            save_dir.mkdir(parents=True, exist_ok=True)
+            (save_dir / f"{n}.json").write_bytes(body)
+        except Exception:
+            pass
+    return "upload_error", resp.status_code, resp.text[:200]
+
+async def main_async(args):
+    dest_prefix = args.dest_path.strip()
+    if dest_prefix and not dest_prefix.endswith("/"):
+        dest_prefix += "/"
+
+    save_dir = Path(DEFAULT_SAVE_DIR) if args.save_local else None
+
+    total = args.end_number - args.start_number + 1
+    print(f"Single-pass: scanning & uploading {total} candidates: {args.gateway}/ipfs/{args.cid}/N.json")
+    print(f"Stopping after {args.max_missing} consecutive misses.")
+    print(f"Concurrency: {args.concurrency}")
+
+    consecutive_missing = 0
+    found_count = 0
+    uploaded_count = 0
+    errors_upload = 0
+
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def process_one(client, n):
+        """Download N.json and upload it to Bunny. Returns (n, status, code)."""
+        dest_key = f"{dest_prefix}{n}.json"
+        async with sem:
+            status, code, detail = await fetch_and_upload(client, args.gateway, args.cid, n, args.storage_zone, args.access_key, args.region_host, dest_key, save_dir)
+        if status == "uploaded":
+            print(f"[{n}] uploaded -> {dest_key}")
+        elif status == "upload_error":
+            print(f"[{n}] upload FAILED (HTTP {code}): {detail}", file=sys.stderr)
+        return n, status, code
+
+    async with make_client(args.concurrency, args.download_timeout) as client:
+        # Sliding window of in-flight tasks; results are drained in n-order
+        # so the consecutive-miss early stop behaves like the serial loop.
+        window = args.concurrency * 2
+        results = {}
+        next_n = args.start_number
+        n_iter = iter(range(args.start_number, args.end_number + 1))
+        stop_submitting = False
+        pending = set()
+
+        while pending or not stop_submitting:
+            while not stop_submitting and len(pending) < window:
+                n = next(n_iter, None)
+                if n is None:
+                    stop_submitting = True
+                    break
+                pending.add(asyncio.create_task(process_one(client, n)))
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                n, status, code = task.result()
+                results[n] = (status, code)
+
+            while next_n in results:
+                status, code = results.pop(next_n)
+                if status == "missing":
+                    consecutive_missing += 1
+                    if next_n % 25 == 0:
+                        print(f"[{next_n}] missing (HTTP {code}); miss streak={consecutive_missing}")
+                    if consecutive_missing >= args.max_missing and not stop_submitting:
+                        print(f"Stopping at n={next_n}: reached {consecutive_missing} consecutive misses.")
+                        stop_submitting = True
+                else:
+                    consecutive_missing = 0
+                    found_count += 1
+                    if status == "uploaded":
+                        uploaded_count += 1
+                    else:
+                        errors_upload += 1
+                next_n += 1
+
+    print(f"Done. Found: {found_count}, Uploaded: {uploaded_count}, Upload errors: {errors_upload}")
+    if errors_upload and save_dir is not None:
+        print(f"Failed upload bodies kept at: {save_dir}")
 
 def main():
     ap = argparse.ArgumentParser(description="Single-pass IPFS (N.json) -> Bunny uploader.")
@@ -79,7 +189,8 @@ def main():
     ap.add_argument("--max-missing", type=int, default=DEFAULT_MAX_MISSING)
     ap.add_argument("--download-timeout", type=int, default=DEFAULT_DOWNLOAD_TIMEOUT)
     ap.add_argument("--dest-path", default=DEFAULT_DEST_PATH)
-    ap.add_argument("--delete-local", action="store_true", default=DEFAULT_DELETE_LOCAL)
+    ap.add_argument("--save-local", action="store_true", help=f"Save bodies of failed uploads to {DEFAULT_SAVE_DIR}/ for inspection")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Number of concurrent download+upload workers")
     # Bunny
     ap.add_argument("--storage-zone", default=DEFAULT_STORAGE_ZONE)
     ap.add_argument("--access-key", default=DEFAULT_ACCESS_KEY)
@@ -91,65 +202,10 @@ def main():
         print("ERROR: Bunny credentials missing. Set --storage-zone/--access-key or env vars BUNNY_STORAGE_ZONE/BUNNY_ACCESS_KEY.", file=sys.stderr)
         sys.exit(1)
 
-    dest_prefix = args.dest_path.strip()
-    if dest_prefix and not dest_prefix.endswith("/"):
-        dest_prefix += "/"
-
-    session = make_session()
-    tempdir = tempfile.mkdtemp(prefix="ipfs_dl_")
-    tempdir_path = Path(tempdir)
-
-    total = args.end_number - args.start_number + 1
-    print(f"Single-pass: scanning & uploading {total} candidates: {args.gateway}/ipfs/{args.cid}/N.json")
-    print(f"Stopping after {args.max_missing} consecutive misses.")
-
-    consecutive_missing = 0
-    found_count = 0
-    uploaded_count = 0
-    errors_upload = 0
-
     try:
-        for n in range(args.start_number, args.end_number + 1):
-            filename = f"{n}.json"
-            local_path = tempdir_path / filename
-
-            ok, code = download_json(session, args.gateway, args.cid, n, local_path, args.download_timeout)
-            if not ok:
-                consecutive_missing += 1
-                if n % 25 == 0:
-                    print(f"[{n}] missing (HTTP {code}); miss streak={consecutive_missing}")
-                if consecutive_missing >= args.max_missing:
-                    print(f"Stopping at n={n}: reached {consecutive_missing} consecutive misses.")
-                    break
-                continue
-
-            # got it
-            consecutive_missing = 0
-            found_count += 1
-            dest_key = f"{dest_prefix}{filename}"
-            up_ok, up_code, up_text = bunny_put(session, args.storage_zone, args.access_key, args.region_host, dest_key, local_path)
-            if up_ok:
-                uploaded_count += 1
-                print(f"[{n}] uploaded -> {dest_key}")
-                if args.delete_local:
-                    try:
-                        local_path.unlink(missing_ok=True)
-                    except Exception:
-                        pass
-            else:
-                errors_upload += 1
-                print(f"[{n}] upload FAILED (HTTP {up_code}): {up_text}", file=sys.stderr)
-                # keep local copy for inspection
-
-        print(f"Done. Found: {found_count}, Uploaded: {uploaded_count}, Upload errors: {errors_upload}")
-        if errors_upload == 0 and args.delete_local:
-            shutil.rmtree(tempdir, ignore_errors=True)
-            print("Local temp files deleted.")
-        else:
-            print(f"Local files kept at: {tempdir}")
+        asyncio.run(main_async(args))
     except KeyboardInterrupt:
         print("\nInterrupted by user.")
-        print(f"Local files kept at: {tempdir}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
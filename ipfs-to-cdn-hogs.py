@@ -10,18 +10,31 @@ Stop after --max-missing consecutive misses.
 """
 
 import argparse
+import collections
+import heapq
+import json
+import mmap
 import os
+import queue
 import sys
 import tempfile
 import shutil
 import logging
+import threading
 import time
 from pathlib import Path
 from urllib.parse import quote
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
 # -------------------- Defaults --------------------
 DEFAULT_CID = "bafybeiac27xcgv3oer2j3p6xvuh4vr2pxlp6hdpywucqkiraw6y3h35cke"
 DEFAULT_GATEWAY = "https://ipfs.io"
@@ -39,6 +52,14 @@ DEFAULT_DELETE_LOCAL = True
 DEFAULT_LOG_FILE     = "ipfs-to-cdn-hogs.log"
 DEFAULT_MAX_RETRIES = 3
 DEFAULT_RETRY_DELAY = 5
+DEFAULT_CDN_CHECK_WORKERS = 32
+DEFAULT_CONCURRENCY = 8
+DEFAULT_GATEWAY_404_THRESHOLD = 10
+GATEWAY_404_COOLDOWN = 60.0
+MIN_PNG_BYTES = 64  # anything smaller is a gateway placeholder, not a PNG
+DEFAULT_CDN_CACHE_TTL = 3600  # seconds before the local preflight cache goes stale
+DEFAULT_UPLOAD_WORKERS = 4
+DOWNLOAD_QUEUE_DEPTH = 16
 
 # Bunny via env by default
 DEFAULT_STORAGE_ZONE = os.getenv("BUNNY_STORAGE_ZONE", "")
@@ -59,13 +80,24 @@ def setup_logging(log_file):
 
 def make_session():
     s = requests.Session()
+    # No urllib3-level retries: they sleep inside the calling thread and
+    # would compound with the retry heap's backoff. The driver owns all
+    # retry/backoff decisions; only a single connect retry stays to paper
+    # over dropped keep-alive connections.
+    # total=None defers to the per-category counters; a total of 0 would
+    # exhaust on the first error of any kind and never grant the connect
+    # retry
     retries = Retry(
-        total=3,  # Reduced total retries since we'll handle retries manually
-        backoff_factor=1.0,  # Increased backoff factor
-        status_forcelist=[429, 500, 502, 503, 504],
+        total=None,
+        connect=1,
+        read=0,
+        status=0,
+        other=0,
+        status_forcelist=[],
+        raise_on_status=False,
         allowed_methods=["GET", "PUT", "HEAD"]
     )
-    adapter = HTTPAdapter(max_retries=retries, pool_connections=20, pool_maxsize=20)
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=64, pool_maxsize=64)
     s.mount("http://", adapter)
     s.mount("https://", adapter)
     return s
@@ -82,98 +114,357 @@ def check_file_exists_on_cdn(session, storage_zone, access_key, region_host, des
         logging.warning(f"Error checking CDN for {dest_key}: {e}")
         return False
 
-def get_existing_files_on_cdn(session, storage_zone, access_key, region_host, dest_prefix, start_num, end_num):
+def list_existing_files_on_cdn(session, storage_zone, access_key, region_host, dest_prefix, start_num, end_num):
+    """List existing N.png files with a single Storage API LIST call.
+
+    Returns the set of existing numbers, or None when the LIST call
+    fails and the caller should fall back to per-file HEAD checks.
+    """
+    base = region_host.strip() if region_host else "storage.bunnycdn.com"
+    url = f"https://{base}/{quote(storage_zone.strip())}/{dest_prefix}"
+    headers = {
+        "AccessKey": access_key.strip(),
+        "Accept": "application/json"
+    }
+
+    try:
+        resp = session.get(url, headers=headers, timeout=60)
+    except Exception as e:
+        logging.warning(f"Error listing CDN folder {dest_prefix}: {e}")
+        return None
+
+    if resp.status_code != 200:
+        logging.warning(f"CDN list failed (HTTP {resp.status_code}); falling back to per-file checks")
+        return None
+
+    # orjson parses the multi-thousand-entry listing in one C pass
+    listing = orjson.loads(resp.content) if orjson is not None else resp.json()
+
+    existing_files = set()
+    for obj in listing:
+        name = obj.get("ObjectName", "")
+        if name.endswith(".png") and name[:-4].isdigit():
+            n = int(name[:-4])
+            if start_num <= n <= end_num:
+                existing_files.add(n)
+    return existing_files
+
+def _cdn_cache_paths(storage_zone, dest_prefix, start_num, end_num):
+    """Cache and journal paths for one (zone, prefix, range) preflight."""
+    cache_dir = Path.home() / ".cache" / "ipfs-to-cdn"
+    key = f"{storage_zone.strip()}-{dest_prefix.strip('/').replace('/', '_')}-{start_num}-{end_num}"
+    return cache_dir / f"{key}.json", cache_dir / f"{key}.journal"
+
+def load_cdn_cache(storage_zone, dest_prefix, start_num, end_num, ttl):
+    """Load a previous run's existing-files set, or None when stale/absent.
+
+    Numbers uploaded since the snapshot are replayed from the journal, so
+    a resumed run skips everything the crashed run already pushed.
+    """
+    cache_file, journal_file = _cdn_cache_paths(storage_zone, dest_prefix, start_num, end_num)
+    try:
+        if time.time() - cache_file.stat().st_mtime > ttl:
+            return None
+        existing_files = set(json.loads(cache_file.read_text()))
+    except (OSError, ValueError):
+        return None
+
+    try:
+        for line in journal_file.read_text().splitlines():
+            if line.isdigit():
+                existing_files.add(int(line))
+    except OSError:
+        pass
+
+    return existing_files
+
+def save_cdn_cache(existing_files, storage_zone, dest_prefix, start_num, end_num):
+    """Snapshot the preflight result; a fresh snapshot obsoletes the journal."""
+    cache_file, journal_file = _cdn_cache_paths(storage_zone, dest_prefix, start_num, end_num)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps(sorted(existing_files)))
+        journal_file.unlink(missing_ok=True)
+    except OSError as e:
+        logging.warning(f"Could not write CDN cache {cache_file}: {e}")
+
+def get_existing_files_on_cdn(session, storage_zone, access_key, region_host, dest_prefix, start_num, end_num, workers=DEFAULT_CDN_CHECK_WORKERS):
     """Get list of files that already exist on CDN in the given range."""
+    # One LIST round-trip replaces thousands of HEADs when the Storage
+    # API cooperates
+    existing_files = list_existing_files_on_cdn(session, storage_zone, access_key, region_host, dest_prefix, start_num, end_num)
+    if existing_files is not None:
+        logging.info(f"CDN list complete: {len(existing_files)} files already exist in range")
+        return existing_files
+
     existing_files = set()
-    base = region_host.strip() if region_host else "storage.bunnycdn.com"
-    
+
     total_files = end_num - start_num + 1
-    logging.info(f"Checking {total_files} files for existence on CDN...")
-    
-    # Check files in batches to avoid overwhelming the CDN
-    batch_size = 100
+    logging.info(f"Checking {total_files} files for existence on CDN ({workers} workers)...")
+
+    def check_one(n):
+        dest_key = f"{dest_prefix}{n}.png"
+        return n, check_file_exists_on_cdn(session, storage_zone, access_key, region_host, dest_key)
+
     checked_count = 0
-    
-    for batch_start in range(start_num, end_num + 1, batch_size):
-        batch_end = min(batch_start + batch_size - 1, end_num)
-        batch_size_actual = batch_end - batch_start + 1
-        
-        logging.info(f"Checking batch {batch_start}-{batch_end} ({batch_size_actual} files)...")
-        
-        # Check each file in the batch
-        for n in range(batch_start, batch_end + 1):
-            filename = f"{n}.png"
-            dest_key = f"{dest_prefix}{filename}"
-            
-            if check_file_exists_on_cdn(session, storage_zone, access_key, region_host, dest_key):
+
+    # HEAD checks are pure RTT; fan them out across the pooled session
+    # instead of paying one round-trip per file serially
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for n, exists in pool.map(check_one, range(start_num, end_num + 1)):
+            if exists:
                 existing_files.add(n)
-                logging.info(f"✓ File {n}.png already exists on CDN")
-            
+
             checked_count += 1
-            
+
             # Progress update every 50 files
             if checked_count % 50 == 0:
                 progress_pct = (checked_count / total_files) * 100
                 logging.info(f"Progress: {checked_count}/{total_files} files checked ({progress_pct:.1f}%) - Found {len(existing_files)} existing files")
-        
-        # Small delay between batches to be nice to the CDN
-        time.sleep(0.1)
-    
+
     logging.info(f"CDN check complete: {len(existing_files)} files already exist out of {total_files} checked")
     return existing_files
 
-def download_png(session: requests.Session, gateways: list, cid: str, n: int, out_file: Path, timeout: int, max_retries: int = 3, retry_delay: int = 5):
-    """Download PNG from IPFS using multiple gateways with retry logic."""
+# Gateways observed to mishandle HEAD (405/501) are remembered so we stop
+# paying for probes against them
+_gateway_supports_head = {}
+
+# Gateway 404s correlate across consecutive Ns (the gateway simply hasn't
+# pinned the directory), so after a long 404 streak a gateway is put on a
+# cooldown instead of being asked about every subsequent N
+_gateway_404_streak = collections.defaultdict(int)
+_gateway_skip_until = {}
+_gateway_state_lock = threading.Lock()
+
+# Stick to the last gateway that served us so consecutive Ns reuse one
+# warm keep-alive connection instead of rotating pool hosts; demoted only
+# after several non-404 failures in a row (single failures can be
+# content-specific)
+_preferred_gateway = {"name": None, "failures": 0}
+GATEWAY_DEMOTE_AFTER = 3
+
+def _gateway_preferred_order(gateways):
+    """Return gateways with the last-successful one moved to the front."""
+    with _gateway_state_lock:
+        preferred = _preferred_gateway["name"]
+    if preferred is None or preferred not in gateways or gateways[0] == preferred:
+        return gateways
+    return [preferred] + [g for g in gateways if g != preferred]
+
+def _gateway_on_cooldown(gateway):
+    with _gateway_state_lock:
+        return time.monotonic() < _gateway_skip_until.get(gateway, 0.0)
+
+def _gateway_hit(gateway):
+    with _gateway_state_lock:
+        _gateway_404_streak[gateway] = 0
+        _preferred_gateway["name"] = gateway
+        _preferred_gateway["failures"] = 0
+
+def _gateway_failure(gateway):
+    with _gateway_state_lock:
+        if _preferred_gateway["name"] == gateway:
+            _preferred_gateway["failures"] += 1
+            if _preferred_gateway["failures"] >= GATEWAY_DEMOTE_AFTER:
+                logging.info(f"Demoting gateway {gateway} after {GATEWAY_DEMOTE_AFTER} consecutive failures")
+                _preferred_gateway["name"] = None
+                _preferred_gateway["failures"] = 0
+
+def _gateway_404(gateway, threshold):
+    with _gateway_state_lock:
+        _gateway_404_streak[gateway] += 1
+        if _gateway_404_streak[gateway] >= threshold:
+            _gateway_skip_until[gateway] = time.monotonic() + GATEWAY_404_COOLDOWN
+            _gateway_404_streak[gateway] = 0
+            logging.info(f"Gateway {gateway} hit {threshold} consecutive 404s; skipping it for {GATEWAY_404_COOLDOWN:.0f}s")
+
+def open_ipfs_stream(session: requests.Session, gateways: list, cid: str, n: int, timeout: int, gateway_404_threshold: int = DEFAULT_GATEWAY_404_THRESHOLD):
+    """Open a streaming GET for N.png with a single sweep across gateways.
+
+    Returns (response, 200) on success — the caller owns closing the
+    response — or (None, status) when the file is missing/unreachable.
+    Retrying with backoff belongs to the caller: a failed sweep is
+    rescheduled on the retry heap rather than sleeping a worker here.
+    """
     filename = f"{n}.png"
-    
-    for attempt in range(max_retries):
-        for gateway_idx, gateway in enumerate(gateways):
-            try:
-                url = f"{gateway.rstrip('/')}/ipfs/{cid}/{filename}"
-                logging.debug(f"Attempt {attempt + 1}/{max_retries}: Trying {gateway} for {filename}")
-                
-                with session.get(url, stream=True, timeout=timeout) as r:
-                    if r.status_code == 200:
-                        out_file.parent.mkdir(parents=True, exist_ok=True)
-                        with open(out_file, "wb") as f:
-                            for chunk in r.iter_content(chunk_size=1024*256):
-                                if chunk:
-                                    f.write(chunk)
-                        logging.debug(f"Successfully downloaded {filename} from {gateway}")
-                        return True, 200
-                    elif r.status_code == 404:
-                        logging.debug(f"File {filename} not found on {gateway} (404)")
-                        return False, 404
-                    else:
-                        logging.warning(f"Gateway {gateway} returned {r.status_code} for {filename}")
-                        
-            except requests.exceptions.Timeout:
-                logging.warning(f"Timeout downloading {filename} from {gateway}")
-            except requests.exceptions.ConnectionError as e:
-                logging.warning(f"Connection error downloading {filename} from {gateway}: {e}")
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Request error downloading {filename} from {gateway}: {e}")
-            except Exception as e:
-                logging.error(f"Unexpected error downloading {filename} from {gateway}: {e}")
-        
-        # If we've tried all gateways and this isn't the last attempt, wait before retrying
-        if attempt < max_retries - 1:
-            wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-            logging.info(f"All gateways failed for {filename}, waiting {wait_time}s before retry {attempt + 2}/{max_retries}")
-            time.sleep(wait_time)
-    
-    logging.error(f"Failed to download {filename} after {max_retries} attempts across all gateways")
-    return False, 504  # Return 504 to indicate gateway timeout
 
-def bunny_put(session, storage_zone, access_key, region_host, dest_key, file_path: Path):
+    order = _gateway_preferred_order(gateways)
+    eligible = [g for g in order if not _gateway_on_cooldown(g)]
+    if not eligible:
+        # A long shared 404 gap can put every gateway on cooldown at
+        # once; the driver's retry budget is shorter than the cooldown,
+        # so skipping the sweep entirely would record files that exist
+        # as missing. Probe through the cooldown instead.
+        eligible = order
+
+    for gateway in eligible:
+        try:
+            url = f"{gateway.rstrip('/')}/ipfs/{cid}/{filename}"
+            logging.debug(f"Trying {gateway} for {filename}")
+
+            # Probe with HEAD first: misses cost one header exchange
+            # instead of a full streamed GET
+            if _gateway_supports_head.get(gateway, True):
+                try:
+                    probe = session.head(url, timeout=min(timeout, 15), allow_redirects=True)
+                    if probe.status_code == 404:
+                        logging.debug(f"File {filename} not found on {gateway} (404 via HEAD)")
+                        _gateway_404(gateway, gateway_404_threshold)
+                        return None, 404
+                    if probe.status_code in (405, 501):
+                        _gateway_supports_head[gateway] = False
+                    elif probe.status_code == 200:
+                        # Gateways sometimes answer 200 with an HTML
+                        # error page or a near-empty body; reject before
+                        # paying for the GET
+                        ctype = probe.headers.get("Content-Type", "")
+                        clen = probe.headers.get("Content-Length", "")
+                        if ctype and not ctype.startswith("image/"):
+                            logging.warning(f"Gateway {gateway} serves {filename} as {ctype}; skipping gateway")
+                            _gateway_failure(gateway)
+                            continue
+                        if clen.isdigit() and int(clen) < MIN_PNG_BYTES:
+                            logging.warning(f"Gateway {gateway} serves {filename} as {clen} bytes; skipping gateway")
+                            _gateway_failure(gateway)
+                            continue
+                except requests.exceptions.RequestException:
+                    pass  # fall through to the GET below
+
+            r = session.get(url, stream=True, timeout=timeout)
+            if r.status_code == 200:
+                logging.debug(f"Successfully opened {filename} from {gateway}")
+                _gateway_hit(gateway)
+                return r, 200
+            elif r.status_code == 404:
+                logging.debug(f"File {filename} not found on {gateway} (404)")
+                r.close()
+                _gateway_404(gateway, gateway_404_threshold)
+                return None, 404
+            else:
+                logging.warning(f"Gateway {gateway} returned {r.status_code} for {filename}")
+                r.close()
+
+        except requests.exceptions.Timeout:
+            logging.warning(f"Timeout downloading {filename} from {gateway}")
+        except requests.exceptions.ConnectionError as e:
+            logging.warning(f"Connection error downloading {filename} from {gateway}: {e}")
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Request error downloading {filename} from {gateway}: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error downloading {filename} from {gateway}: {e}")
+
+        # Reaching the end of the iteration means this gateway failed
+        # (timeout/5xx/transport error); 200 and 404 return above
+        _gateway_failure(gateway)
+
+    return None, 504  # Return 504 to indicate gateway timeout
+
+def probe_collection_end(session, gateways, cid, timeout=30):
+    """Ask a gateway for the CID's directory listing to learn the true max N.
+
+    Knowing the real end of the collection means the run never burns
+    max_missing full probe rounds past the tail. Returns the highest
+    N.png number, or None when no gateway serves the listing (the
+    miss-streak stop rule then applies as before).
+    """
+    for gateway in gateways:
+        url = f"{gateway.rstrip('/')}/ipfs/{cid}/?format=dag-json"
+        try:
+            resp = session.get(url, timeout=timeout, headers={"Accept": "application/vnd.ipld.dag-json"})
+        except requests.exceptions.RequestException:
+            continue
+        if resp.status_code != 200:
+            continue
+        try:
+            listing = orjson.loads(resp.content) if orjson is not None else resp.json()
+        except ValueError:
+            continue
+        if not isinstance(listing, dict):
+            continue
+
+        true_end = None
+        for link in listing.get("Links", []):
+            name = link.get("Name", "")
+            if name.endswith(".png") and name[:-4].isdigit():
+                n = int(name[:-4])
+                if true_end is None or n > true_end:
+                    true_end = n
+        if true_end is not None:
+            return true_end
+    return None
+
+def download_png(session: requests.Session, gateways: list, cid: str, n: int, out_file: Path, timeout: int, gateway_404_threshold: int = DEFAULT_GATEWAY_404_THRESHOLD):
+    """Download PNG from IPFS to a local file (used when keeping local copies)."""
+    r, code = open_ipfs_stream(session, gateways, cid, n, timeout, gateway_404_threshold)
+    if r is None:
+        return False, code
+    try:
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        # Content-Length counts the wire bytes; with a Content-Encoding
+        # the decoded stream has a different size, so the header is only
+        # trustworthy for plain responses
+        content_length = r.headers.get("Content-Length", "")
+        encoded = r.headers.get("Content-Encoding", "") not in ("", "identity")
+        expected = int(content_length) if content_length.isdigit() and not encoded else None
+        with open(out_file, "wb") as f:
+            # Pre-size to the announced length so the filesystem lays the
+            # file out as one extent instead of growing it chunk by chunk
+            if expected is not None and hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, expected)
+                except OSError:
+                    pass  # e.g. filesystem without fallocate support
+            # copyfileobj copies in C with 1 MiB reads; no per-chunk
+            # Python bytes objects or method dispatch
+            r.raw.decode_content = True
+            shutil.copyfileobj(r.raw, f, length=1024*1024)
+            # Drop any fallocate padding past what actually arrived so a
+            # truncated stream can't masquerade as a full-length PNG
+            written = f.tell()
+            f.truncate(written)
+        if expected is not None and written != expected:
+            logging.warning(f"Short download for {n}.png: {written} of {expected} bytes")
+            return False, 0
+    finally:
+        r.close()
+    return True, 200
+
+def bunny_base_url(storage_zone, region_host):
+    """Build the storage-zone URL prefix once per run; quote() and strip()
+    stay out of the per-upload hot path."""
     base = region_host.strip() if region_host else "storage.bunnycdn.com"
-    url = f"https://{base}/{quote(storage_zone.strip())}/{dest_key}"
-    headers = {
-        "AccessKey": access_key.strip(),
-        "Content-Type": "application/octet-stream"
-    }
+    return f"https://{base}/{quote(storage_zone.strip())}/"
+
+def bunny_put(session, base_url, headers, dest_key, file_path: Path):
+    url = base_url + dest_key
     with open(file_path, "rb") as f:
-        resp = session.put(url, headers=headers, data=f, timeout=180)
+        if os.fstat(f.fileno()).st_size:
+            # mmap the body so the socket layer sends straight from the
+            # page cache instead of chunk-reading through Python
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                resp = session.put(url, headers=headers, data=mm, timeout=180)
+            finally:
+                mm.close()
+        else:
+            # mmap refuses zero-length files
+            resp = session.put(url, headers=headers, data=b"", timeout=180)
+    return resp.status_code in (200, 201), resp.status_code, resp.text[:200]
+
+def bunny_put_stream(session, base_url, headers, dest_key, r):
+    """PUT a streaming gateway response straight to Bunny (no temp file).
+
+    requests chunk-encodes the file-like body, so the upload reads from
+    the gateway socket as it sends; bytes never touch disk.
+    """
+    url = base_url + dest_key
+    try:
+        r.raw.decode_content = True
+        resp = session.put(url, headers=headers, data=r.raw, timeout=180)
+    except requests.exceptions.RequestException as e:
+        return False, 0, str(e)[:200]
+    finally:
+        r.close()
     return resp.status_code in (200, 201), resp.status_code, resp.text[:200]
 
 def main():
@@ -188,9 +479,15 @@ def main():
     ap.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Max retries per file across all gateways")
     ap.add_argument("--retry-delay", type=int, default=DEFAULT_RETRY_DELAY, help="Base delay between retries (seconds)")
     ap.add_argument("--dest-path", default=DEFAULT_DEST_PATH)
-    ap.add_argument("--delete-local", action="store_true", default=DEFAULT_DELETE_LOCAL)
+    ap.add_argument("--delete-local", action=argparse.BooleanOptionalAction, default=DEFAULT_DELETE_LOCAL,
+                    help="Stream uploads and discard local copies (default); --no-delete-local downloads to disk and keeps the files")
     ap.add_argument("--log-file", default=DEFAULT_LOG_FILE)
     ap.add_argument("--skip-cdn-check", action="store_true", help="Skip checking CDN for existing files")
+    ap.add_argument("--cdn-check-workers", type=int, default=DEFAULT_CDN_CHECK_WORKERS, help="Concurrent HEAD requests during the CDN existence check")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Number of concurrent gateway downloads")
+    ap.add_argument("--gateway-404-threshold", type=int, default=DEFAULT_GATEWAY_404_THRESHOLD, help="Consecutive 404s before a gateway is cooled down for 60s")
+    ap.add_argument("--cdn-cache-ttl", type=int, default=DEFAULT_CDN_CACHE_TTL, help="Seconds to trust the local cache of the CDN existence check")
+    ap.add_argument("--processes", type=int, default=1, help="Split the range into this many contiguous shards, one process each")
     ap.add_argument("--resume-from", type=int, help="Resume from this number (useful after failures)")
     # Bunny
     ap.add_argument("--storage-zone", default=DEFAULT_STORAGE_ZONE)
@@ -218,24 +515,99 @@ def main():
     logger.info(f"Max retries per file: {args.max_retries}")
     logger.info(f"Retry delay: {args.retry_delay}s")
 
+    # One directory-listing request can reveal where the collection
+    # really ends, sparing the max_missing probe tail entirely
+    probe_session = make_session()
+    true_end = probe_collection_end(probe_session, args.gateways, args.cid)
+    probe_session.close()
+    if true_end is not None and true_end < args.end_number:
+        logger.info(f"Gateway directory listing reports max N = {true_end}; capping end number (was {args.end_number})")
+        args.end_number = true_end
+
+    if args.processes > 1:
+        # Contiguous shards, one process each: every shard runs its own
+        # session (so TLS crypto escapes this process's GIL) and keeps
+        # its own miss streak
+        total = args.end_number - start_number + 1
+        shard_size = (total + args.processes - 1) // args.processes
+        shards = [(s, min(s + shard_size - 1, args.end_number))
+                  for s in range(start_number, args.end_number + 1, shard_size)]
+        logger.info(f"Sharding range across {len(shards)} processes (~{shard_size} candidates each)")
+        found = uploaded = skipped = errors = 0
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            futures = [pool.submit(run_shard, args, s, e) for s, e in shards]
+            for fut in futures:
+                f, u, sk, er = fut.result()
+                found += f
+                uploaded += u
+                skipped += sk
+                errors += er
+        logger.info(f"All shards done. Found: {found}, Uploaded: {uploaded}, Skipped: {skipped}, Upload errors: {errors}")
+    else:
+        run_shard(args, start_number, args.end_number)
+
+def run_shard(args, start_number, end_number):
+    """Run the full pipeline over one contiguous range of Ns.
+
+    Each shard owns its session, temp dir, preflight, and miss streak,
+    so shards are independent enough to run in separate processes.
+    Returns (found, uploaded, skipped, upload_errors).
+    """
+    # Worker processes start with an unconfigured root logger
+    if not logging.getLogger().handlers:
+        setup_logging(args.log_file)
+    logger = logging.getLogger(__name__)
+
     dest_prefix = args.dest_path.strip()
     if dest_prefix and not dest_prefix.endswith("/"):
         dest_prefix += "/"
 
     session = make_session()
+
+    # Constant for the whole run; built once instead of per upload
+    bunny_base = bunny_base_url(args.storage_zone, args.region_host)
+    bunny_headers = {
+        "AccessKey": args.access_key.strip(),
+        "Content-Type": "application/octet-stream"
+    }
+
     tempdir = tempfile.mkdtemp(prefix="ipfs_dl_")
     tempdir_path = Path(tempdir)
 
-    total = args.end_number - start_number + 1
+    total = end_number - start_number + 1
     logger.info(f"Single-pass: scanning & uploading {total} candidates: {args.gateways[0]}/ipfs/{args.cid}/N.png")
     logger.info(f"Stopping after {args.max_missing} consecutive misses.")
 
-    # Check for existing files on CDN
+    # Check for existing files on CDN (local snapshot first, then network)
     existing_files = set()
     if not args.skip_cdn_check:
-        logger.info("Checking CDN for existing files...")
-        existing_files = get_existing_files_on_cdn(session, args.storage_zone, args.access_key, args.region_host, dest_prefix, start_number, args.end_number)
-        logger.info(f"Found {len(existing_files)} existing files on CDN")
+        cached = load_cdn_cache(args.storage_zone, dest_prefix, start_number, end_number, args.cdn_cache_ttl)
+        if cached is not None:
+            existing_files = cached
+            logger.info(f"Loaded {len(existing_files)} existing files from local cache")
+        else:
+            logger.info("Checking CDN for existing files...")
+            existing_files = get_existing_files_on_cdn(session, args.storage_zone, args.access_key, args.region_host, dest_prefix, start_number, end_number, args.cdn_check_workers)
+            logger.info(f"Found {len(existing_files)} existing files on CDN")
+            save_cdn_cache(existing_files, args.storage_zone, dest_prefix, start_number, end_number)
+
+    # Journal successful uploads so an interrupted run resumes without
+    # re-probing the CDN
+    _, journal_file = _cdn_cache_paths(args.storage_zone, dest_prefix, start_number, end_number)
+    try:
+        journal_file.parent.mkdir(parents=True, exist_ok=True)
+        journal = open(journal_file, "a")
+    except OSError as e:
+        logger.warning(f"Could not open upload journal {journal_file}: {e}")
+        journal = None
+
+    # Contiguous bitmap indexed by n - start for the hot-path membership
+    # test; no hashing per candidate
+    existing_bitmap = bytearray((total + 7) >> 3)
+    for existing_n in existing_files:
+        i = existing_n - start_number
+        if 0 <= i < total:
+            existing_bitmap[i >> 3] |= 1 << (i & 7)
 
     consecutive_missing = 0
     found_count = 0
@@ -243,45 +615,159 @@ def main():
     skipped_count = 0
     errors_upload = 0
 
-    try:
-        for n in range(start_number, args.end_number + 1):
-            filename = f"{n}.png"
-            local_path = tempdir_path / filename
-            dest_key = f"{dest_prefix}{filename}"
-
-            # Skip if file already exists on CDN
-            if n in existing_files:
-                skipped_count += 1
-                if n % 100 == 0:
-                    logger.info(f"[{n}] skipped (already exists on CDN)")
-                continue
-
-            ok, code = download_png(session, args.gateways, args.cid, n, local_path, args.download_timeout, args.max_retries, args.retry_delay)
-            if not ok:
-                consecutive_missing += 1
-                if n % 25 == 0:
-                    logger.info(f"[{n}] missing (HTTP {code}); miss streak={consecutive_missing}")
-                if consecutive_missing >= args.max_missing:
-                    logger.warning(f"Stopping at n={n}: reached {consecutive_missing} consecutive misses.")
-                    break
-                continue
+    # Downloads (producer, this thread) and uploads (consumer pool) run
+    # as a two-stage pipeline joined by a bounded queue, so the upload
+    # RTT overlaps the next download instead of adding to it
+    upload_q = queue.Queue(maxsize=DOWNLOAD_QUEUE_DEPTH)
+    counter_lock = threading.Lock()
 
-            # got it
-            consecutive_missing = 0
-            found_count += 1
-            up_ok, up_code, up_text = bunny_put(session, args.storage_zone, args.access_key, args.region_host, dest_key, local_path)
+    def upload_worker():
+        nonlocal uploaded_count, errors_upload
+        while True:
+            item = upload_q.get()
+            if item is None:
+                break
+            n, stream, local_path, dest_key = item
+            if stream is not None:
+                up_ok, up_code, up_text = bunny_put_stream(session, bunny_base, bunny_headers, dest_key, stream)
+            else:
+                up_ok, up_code, up_text = bunny_put(session, bunny_base, bunny_headers, dest_key, local_path)
             if up_ok:
-                uploaded_count += 1
+                with counter_lock:
+                    uploaded_count += 1
+                    if journal is not None:
+                        journal.write(f"{n}\n")
+                        journal.flush()
                 logger.info(f"[{n}] uploaded -> {dest_key}")
-                if args.delete_local:
+                if stream is None and args.delete_local:
                     try:
                         local_path.unlink(missing_ok=True)
                     except Exception:
                         pass
             else:
-                errors_upload += 1
+                with counter_lock:
+                    errors_upload += 1
                 logger.error(f"[{n}] upload FAILED (HTTP {up_code}): {up_text}")
-                # keep local copy for inspection
+                # keep local copy for inspection (file mode only)
+
+    upload_pool = ThreadPoolExecutor(max_workers=DEFAULT_UPLOAD_WORKERS)
+    uploaders = [upload_pool.submit(upload_worker) for _ in range(DEFAULT_UPLOAD_WORKERS)]
+    download_pool = ThreadPoolExecutor(max_workers=args.concurrency)
+
+    def download_one(n, attempt):
+        """Fetch one N and hand successes to the uploaders. Returns (n, ok, code, attempt)."""
+        filename = f"{n}.png"
+        local_path = tempdir_path / filename
+        dest_key = f"{dest_prefix}{filename}"
+        if args.delete_local:
+            # No local copy wanted: hand the open gateway stream
+            # to the uploaders so bytes never touch disk
+            stream, code = open_ipfs_stream(session, args.gateways, args.cid, n, args.download_timeout, args.gateway_404_threshold)
+            ok = stream is not None
+        else:
+            stream = None
+            ok, code = download_png(session, args.gateways, args.cid, n, local_path, args.download_timeout, args.gateway_404_threshold)
+        if ok:
+            upload_q.put((n, stream, local_path, dest_key))
+        return n, ok, code, attempt
+
+    try:
+        try:
+            # Downloads overlap N-wide; completions are drained in
+            # n-order so the consecutive-miss stop rule behaves exactly
+            # like the serial loop even though requests are in flight
+            # out of order
+            window = args.concurrency * 2
+            results = {}
+            next_n = start_number
+            n_iter = iter(range(start_number, end_number + 1))
+            stop_submitting = False
+            pending = set()
+            # Countdown counters instead of per-item modulo checks
+            skip_log_at = 100
+            miss_log_at = 25
+            # Failed sweeps are rescheduled as (ready_time, n, attempt)
+            # instead of parking a worker in time.sleep: the pool keeps
+            # fetching other Ns while a retry waits out its backoff
+            retry_heap = []
+
+            while pending or retry_heap or not stop_submitting:
+                now = time.monotonic()
+                while retry_heap and retry_heap[0][0] <= now and len(pending) < window:
+                    _, n, attempt = heapq.heappop(retry_heap)
+                    pending.add(download_pool.submit(download_one, n, attempt))
+
+                while not stop_submitting and len(pending) < window:
+                    n = next(n_iter, None)
+                    if n is None:
+                        stop_submitting = True
+                        break
+
+                    # Skip if file already exists on CDN (neutral for
+                    # the miss streak, like the serial continue)
+                    i = n - start_number
+                    if (existing_bitmap[i >> 3] >> (i & 7)) & 1:
+                        skipped_count += 1
+                        skip_log_at -= 1
+                        if skip_log_at == 0:
+                            skip_log_at = 100
+                            logger.info(f"[{n}] skipped (already exists on CDN)")
+                        results[n] = ("skipped", 0)
+                        continue
+
+                    pending.add(download_pool.submit(download_one, n, 0))
+
+                if pending:
+                    # Bound the wait so retries whose backoff expires get
+                    # submitted promptly
+                    wait_timeout = None
+                    if retry_heap:
+                        wait_timeout = max(0.0, retry_heap[0][0] - time.monotonic())
+                    done, pending = wait(pending, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        n, ok, code, attempt = fut.result()
+                        if not ok and code != 404 and attempt + 1 < args.max_retries:
+                            # Transient gateway failure: back off on the
+                            # heap, don't record a result yet
+                            backoff = args.retry_delay * (2 ** attempt)
+                            logger.info(f"All gateways failed for {n}.png, retry {attempt + 2}/{args.max_retries} in {backoff}s")
+                            heapq.heappush(retry_heap, (time.monotonic() + backoff, n, attempt + 1))
+                            continue
+                        if not ok and code != 404:
+                            logger.error(f"Failed to download {n}.png after {args.max_retries} attempts across all gateways")
+                        results[n] = (ok, code)
+                elif retry_heap:
+                    time.sleep(max(0.0, retry_heap[0][0] - time.monotonic()))
+                    continue
+                elif not results:
+                    break
+
+                while next_n in results:
+                    ok, code = results.pop(next_n)
+                    if ok == "skipped":
+                        pass
+                    elif not ok:
+                        consecutive_missing += 1
+                        miss_log_at -= 1
+                        if miss_log_at == 0:
+                            miss_log_at = 25
+                            logger.info(f"[{next_n}] missing (HTTP {code}); miss streak={consecutive_missing}")
+                        if consecutive_missing >= args.max_missing and not stop_submitting:
+                            logger.warning(f"Stopping at n={next_n}: reached {consecutive_missing} consecutive misses.")
+                            stop_submitting = True
+                    else:
+                        consecutive_missing = 0
+                        found_count += 1
+                    next_n += 1
+        finally:
+            # Drain downloads first (they feed the queue), then sentinel
+            # the uploaders and wait for the queue to empty
+            download_pool.shutdown(wait=True)
+            for _ in uploaders:
+                upload_q.put(None)
+            upload_pool.shutdown(wait=True)
+            if journal is not None:
+                journal.close()
 
         logger.info(f"Done. Found: {found_count}, Uploaded: {uploaded_count}, Skipped: {skipped_count}, Upload errors: {errors_upload}")
         if errors_upload == 0 and args.delete_local:
@@ -296,5 +782,7 @@ def main():
         logger.error(f"Unexpected error: {e}")
         raise
 
+    return found_count, uploaded_count, skipped_count, errors_upload
+
 if __name__ == "__main__":
     main()
\ No newline at end of file